@@ -1,8 +1,9 @@
 # healthcare.py
 import streamlit as st
-from streamlit_mic_recorder import speech_to_text
 from importlib import import_module
 import os
+import re
+import time
 
 # --- 1. CONFIGURATION AND SAFETY ---
 SYSTEM_INSTRUCTION = """
@@ -20,10 +21,20 @@ RULES TO STRICTLY FOLLOW:
 MODEL_NAME = 'gemini-2.5-flash'
 APP_TITLE = "🩺 Contextual Health Companion (Text Reader)"
 
+_DISCLAIMER_HTML = """
+<div style="padding: 5px;">
+<h4 style="color: #FF4B4B; margin-top: 0;">⚠ SAFETY FIRST</h4>
+<p>I provide general information only. <b>I am not a doctor.</b> Always consult a professional.</p>
+</div>
+"""
+
 # --- CONFIGURATION CONSTANTS ---
 TRIGGER_KEYWORDS = ["symptom", "constipation", "pain", "fever", "headache", "cold"]
-AGE_RANGES = ["0-12", "13-17", "18-45", "46-65", "65+"]
-GENDER_OPTIONS = ["Male", "Female", "Prefer Not to Say"]
+# Compiled once so keyword detection is a single case-insensitive scan per input
+TRIGGER_RE = re.compile(r"(?:%s)" % "|".join(map(re.escape, TRIGGER_KEYWORDS)), re.IGNORECASE)
+AGE_RANGES = ("0-12", "13-17", "18-45", "46-65", "65+")
+GENDER_OPTIONS = ("Male", "Female", "Prefer Not to Say")
+STREAM_FLUSH_INTERVAL = 0.05  # seconds between streamed UI updates (~20 Hz)
 
 LANGUAGE_MAP = {
     'English (Default)': 'English',
@@ -31,24 +42,26 @@ LANGUAGE_MAP = {
     'Hindi (हिन्दी)': 'Hindi',
     'Telugu (తెలుగు)': 'Telugu'
 }
+LANGUAGE_OPTIONS = tuple(LANGUAGE_MAP)
+# Prompt suffixes keyed by (language, is_medicine_request)
+_LANGUAGE_SUFFIX = {(lang, False): f"\n\n(Respond in {lang} language)" for lang in LANGUAGE_MAP.values()}
+_LANGUAGE_SUFFIX.update({(lang, True): f"\n\nPlease provide this information in *{lang}* language." for lang in LANGUAGE_MAP.values()})
 # -----------------------------
 
 # --- STATE MANAGEMENT ---
-if 'asking_for_details' not in st.session_state:
-    st.session_state.asking_for_details = False
-
-if 'user_details' not in st.session_state:
-    st.session_state.user_details = {}
-
-if 'current_language' not in st.session_state:
-    st.session_state.current_language = 'English'
-
-if 'show_prescription_form' not in st.session_state:
-    st.session_state.show_prescription_form = False
+_WELCOME_TEXT = "*Welcome!* I am your Healthcare Companion. I can provide health information in English, Kannada, Hindi, or Telugu."
+_WELCOME_SEED = ({"role": "assistant", "content": _WELCOME_TEXT},)
+
+_STATE_DEFAULTS = {
+    'asking_for_details': False,
+    'user_details': {},
+    'current_language': 'English',
+    'show_prescription_form': False,
+    'messages': list(_WELCOME_SEED),
+}
 
-if 'messages' not in st.session_state:
-    st.session_state.messages = [{"role": "assistant", "content":
-        "*Welcome!* I am your Healthcare Companion. I can provide health information in English, Kannada, Hindi, or Telugu."}]
+for key, default in _STATE_DEFAULTS.items():
+    st.session_state.setdefault(key, default)
 # -----------------------------
 
 # --- 2. INITIALIZATION FUNCTIONS ---
@@ -62,14 +75,21 @@ def lazy_import_genai():
     except Exception as e:
         return None, None
 
+def lazy_import_speech_to_text():
+    """Import the mic recorder widget only when the voice input is rendered."""
+    return import_module("streamlit_mic_recorder").speech_to_text
+
+@st.cache_resource(show_spinner=False)
+def _build_client(api_key):
+    """Creates the Gemini Client once per process so every session shares it."""
+    genai, _ = lazy_import_genai()
+    return genai.Client(api_key=api_key)
+
 def get_gemini_client():
     """
-    Initializes, stores, and returns the persistent Gemini Client.
+    Returns the process-wide Gemini Client, creating it on first use.
     Uses lazy import so the app won't crash immediately on import failure.
     """
-    if 'gemini_client' in st.session_state:
-        return st.session_state['gemini_client']
-
     # Ensure API key exists
     if "GEMINI_API_KEY" not in st.secrets:
         st.error("❌ API Key not found. Please set your GEMINI_API_KEY in .streamlit/secrets.toml (App → Manage app → Secrets).")
@@ -86,8 +106,7 @@ def get_gemini_client():
         return None
 
     try:
-        client = genai.Client(api_key=st.secrets["GEMINI_API_KEY"])
-        st.session_state['gemini_client'] = client
+        client = _build_client(st.secrets["GEMINI_API_KEY"])
         st.session_state['_genai_types'] = types
         return client
     except Exception as e:
@@ -104,6 +123,7 @@ def reset_chat():
         st.session_state.asking_for_details = False
         st.session_state.user_details = {}
         st.session_state.show_prescription_form = False
+        st.session_state.pop('last_symptom', None)
         return
 
     # Use previously saved types
@@ -113,57 +133,114 @@ def reset_chat():
         return
 
     try:
-        config = types.GenerateContentConfig(system_instruction=SYSTEM_INSTRUCTION)
+        # Chat replies are streamed to a waiting user, so use the priority tier
+        config = types.GenerateContentConfig(
+            system_instruction=SYSTEM_INSTRUCTION,
+            service_tier=types.ServiceTier.PRIORITY,
+        )
         st.session_state['gemini_chat'] = client.chats.create(model=MODEL_NAME, config=config)
     except Exception as e:
         st.error(f"❌ Error creating Gemini chat instance: {e}")
         return
 
-    st.session_state.messages = [{"role": "assistant", "content":
-        "*Welcome!* I am your Healthcare Companion. I can provide health information in English, Kannada, Hindi, or Telugu."}]
+    st.session_state.messages = list(_WELCOME_SEED)
     st.session_state.asking_for_details = False
     st.session_state.user_details = {}
     st.session_state.show_prescription_form = False
+    st.session_state.pop('last_symptom', None)
 
     # don't force rerun here; let caller decide
     return
 
 # --- HELPER FUNCTION FOR AI RESPONSE (TEXT ONLY) ---
 
-def handle_final_response(base_prompt, is_medicine_request=False):
+@st.cache_data(ttl=60 * 60 * 24, show_spinner=False)
+def _cached_medicine_answer(medicine_name, target_lang):
+    """
+    Fetches the medicine explanation for one (name, language) pair.
+    The answer doesn't depend on chat history, so repeat lookups are served from cache.
+    """
+    _, types = lazy_import_genai()
+    client = _build_client(st.secrets["GEMINI_API_KEY"])
+    prompt = (
+        f"Please explain the general usage, purpose, and common symptoms treated by the medicine: '{medicine_name}'. "
+        f"Provide a clear note on when it is typically used."
+    ) + _LANGUAGE_SUFFIX[(target_lang, True)]
+    # Each answer is fetched once per day and then served from cache, so the cheaper flex tier fits
+    config = types.GenerateContentConfig(
+        system_instruction=SYSTEM_INSTRUCTION,
+        service_tier=types.ServiceTier.FLEX,
+    )
+    response = client.models.generate_content(model=MODEL_NAME, contents=prompt, config=config)
+    # Blocked or empty responses have no text; raise so the failure isn't cached
+    if not response.text:
+        raise ValueError("Gemini returned no text for this medicine (the response may have been blocked).")
+    return response.text
+
+def handle_medicine_request(medicine_name):
+    """
+    Fetches the (cached, non-streaming) medicine answer and logs the exchange.
+    No streaming here: the form closes and the app reruns right after submit.
+    The exchange only goes into the visible history, not gemini_chat, so chat
+    follow-ups about the medicine reach Gemini without this context.
+    """
+    if 'gemini_chat' in st.session_state:
+        try:
+            with st.spinner("Fetching medicine information..."):
+                answer = _cached_medicine_answer(medicine_name.lower().strip(), st.session_state.current_language)
+        except Exception as e:
+            answer = f"An error occurred while contacting Gemini: {e}"
+    else:
+        answer = "Error: Chat not initialized. Please check API key and imports."
+
+    st.session_state.messages.extend((
+        {"role": "user", "content": f"Requesting info for medicine: {medicine_name}"},
+        {"role": "assistant", "content": answer},
+    ))
+
+def handle_final_response(base_prompt, container):
     """
     Handles the API call and streams the text response.
     Appends language instruction to the prompt.
+    Renders the new exchange into container, which sits right below the chat history.
     """
+    # Resolve session state once; the proxy lookups are slower than locals
     target_lang = st.session_state.current_language
+    messages = st.session_state.messages
+    chat = st.session_state.get('gemini_chat')
 
     # Construct the final prompt with language instruction
-    if is_medicine_request:
-        final_prompt = f"{base_prompt}\n\nPlease provide this information in *{target_lang}* language."
-    else:
-        final_prompt = f"{base_prompt}\n\n(Respond in {target_lang} language)"
+    final_prompt = base_prompt + _LANGUAGE_SUFFIX[(target_lang, False)]
 
-    # Append user prompt to history
-    display_content = base_prompt if not is_medicine_request else f"Requesting info for medicine: {base_prompt}"
-    st.session_state.messages.append({"role": "user", "content": display_content})
+    # Append user prompt to history and show it, since history was already drawn this run
+    messages.append({"role": "user", "content": base_prompt})
+    with container.chat_message("user"):
+        st.markdown(base_prompt)
 
     full_response = ""
 
-    with st.chat_message("assistant"):
+    with container.chat_message("assistant"):
         message_placeholder = st.empty()
 
-        if 'gemini_chat' in st.session_state:
+        if chat is not None:
             try:
                 # send_message_stream might raise; show clear errors
-                response_stream = st.session_state['gemini_chat'].send_message_stream(final_prompt)
+                response_stream = chat.send_message_stream(final_prompt)
 
+                parts = []
+                last_flush = time.monotonic()
                 for chunk in response_stream:
                     # chunk.text may be present or raise; handle safely
                     text = getattr(chunk, "text", None)
                     if text:
-                        full_response += text
-                        message_placeholder.markdown(full_response + "▌")
-
+                        parts.append(text)
+                        # Throttle re-renders; the final markdown call below always flushes
+                        now = time.monotonic()
+                        if now - last_flush >= STREAM_FLUSH_INTERVAL:
+                            message_placeholder.markdown("".join(parts) + "▌")
+                            last_flush = now
+
+                full_response = "".join(parts)
                 message_placeholder.markdown(full_response)
             except Exception as e:
                 full_response = f"An error occurred while contacting Gemini: {e}"
@@ -173,25 +250,21 @@ def handle_final_response(base_prompt, is_medicine_request=False):
             message_placeholder.markdown(full_response)
 
     # Log assistant response to history
-    st.session_state.messages.append({
+    messages.append({
         "role": "assistant",
         "content": full_response
     })
 
 # --- HELPER FOR CONTEXT FORM SUBMISSION ---
 
-def handle_context_form_submit(user_gender, user_age, user_weight):
+def handle_context_form_submit(user_gender, user_age, user_weight, container):
     st.session_state.user_details['gender'] = user_gender
     st.session_state.user_details['age'] = user_age
     st.session_state.user_details['weight'] = user_weight
     st.session_state.asking_for_details = False
 
-    # Find the original symptom
-    original_symptom = next(
-        (msg['content'] for msg in reversed(st.session_state.messages)
-         if msg['role'] == 'user' and not msg['content'].startswith('Requesting info')),
-        "General health inquiry."
-    )
+    # Original symptom is recorded when the trigger keyword is detected
+    original_symptom = st.session_state.get('last_symptom', "General health inquiry.")
 
     prompt = (
         f"Original request: {original_symptom}\n"
@@ -199,7 +272,7 @@ def handle_context_form_submit(user_gender, user_age, user_weight):
         "Provide general, educational health information based on this context."
     )
 
-    handle_final_response(prompt)
+    handle_final_response(prompt, container)
     # no forced rerun here; let Streamlit continue naturally
 
 # --- 3. STREAMLIT APP UI ---
@@ -219,12 +292,15 @@ with st.sidebar:
     st.subheader("Select Reading Language")
     selected_lang_key = st.selectbox(
         "Choose the language for the answer:",
-        options=list(LANGUAGE_MAP.keys()),
+        options=LANGUAGE_OPTIONS,
         index=0
     )
     # Update state immediately
     st.session_state.current_language = LANGUAGE_MAP[selected_lang_key]
 
+    # Voice input is opt-in so the mic recorder isn't loaded for text-only users
+    st.toggle("🎤 Enable voice input", key='voice_enabled')
+
     st.markdown("---")
 
     # 2. MEDICINE INFO BUTTON
@@ -241,31 +317,30 @@ with st.sidebar:
         for k, v in st.session_state.user_details.items():
             st.caption(f"{k}: {v}")
 
-    # Debugging helpers (collapsed)
-    with st.expander("Debug"):
-        st.write("Session keys:", list(st.session_state.keys()))
-        # show if a local google folder would collide
-        repo_entries = [p for p in os.listdir('.') if p.lower().startswith('google')]
-        if repo_entries:
-            st.warning("Repo entries starting with 'google' (rename/remove to avoid import conflicts):")
-            st.write(repo_entries)
+    # Debugging helpers (collapsed, only when DEBUG is set in secrets)
+    if st.secrets.get("DEBUG"):
+        with st.expander("Debug"):
+            st.write("Session keys:", list(st.session_state.keys()))
+            # show if a local google folder would collide
+            repo_entries = [p for p in os.listdir('.') if p.lower().startswith('google')]
+            if repo_entries:
+                st.warning("Repo entries starting with 'google' (rename/remove to avoid import conflicts):")
+                st.write(repo_entries)
 
 # --- MAIN CHAT AREA ---
 
 # Safety Disclaimer
 with st.container():
-    st.markdown("""
-    <div style="padding: 5px;">
-    <h4 style="color: #FF4B4B; margin-top: 0;">⚠ SAFETY FIRST</h4>
-    <p>I provide general information only. <b>I am not a doctor.</b> Always consult a professional.</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_DISCLAIMER_HTML, unsafe_allow_html=True)
 
 # Display Chat History
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
+# New exchanges stream here so they appear in place, above the forms and inputs
+pending_exchange = st.container()
+
 # --- INTERACTIVE FORMS ---
 
 # 1. MEDICINE INFORMATION FORM
@@ -279,13 +354,9 @@ if st.session_state.show_prescription_form:
         med_submitted = st.form_submit_button("Get Information")
 
         if med_submitted and medicine_name:
-            med_prompt = (
-                f"Please explain the general usage, purpose, and common symptoms treated by the medicine: '{medicine_name}'. "
-                f"Provide a clear note on when it is typically used."
-            )
-            handle_final_response(med_prompt, is_medicine_request=True)
+            handle_medicine_request(medicine_name)
             st.session_state.show_prescription_form = False
-            st.experimental_rerun()
+            st.rerun()
 
 # 2. CONTEXT DETAILS FORM
 if st.session_state.asking_for_details:
@@ -296,8 +367,8 @@ if st.session_state.asking_for_details:
         weight = st.number_input("Weight (kg)", 1, 300, 70)
 
         if st.form_submit_button("Submit"):
-            handle_context_form_submit(gender, age, weight)
-            st.experimental_rerun()
+            handle_context_form_submit(gender, age, weight, pending_exchange)
+            st.rerun()
 
 # --- MAIN INPUT (Voice & Text) ---
 
@@ -306,18 +377,21 @@ if not st.session_state.asking_for_details and not st.session_state.show_prescri
     st.markdown("---")
     col1, col2 = st.columns([1, 4])
 
-    with col1:
-        try:
-            voice_text = speech_to_text(
-                language='en',
-                start_prompt="🎤 Speak",
-                stop_prompt="🛑 Stop",
-                just_once=True,
-                key='voice_input'
-            )
-        except Exception as e:
-            voice_text = ""
-            st.sidebar.error(f"Voice recorder error: {e}")
+    voice_text = ""
+    if st.session_state.get('voice_enabled'):
+        with col1:
+            try:
+                speech_to_text = lazy_import_speech_to_text()
+                voice_text = speech_to_text(
+                    language='en',
+                    start_prompt="🎤 Speak",
+                    stop_prompt="🛑 Stop",
+                    just_once=True,
+                    key='voice_input'
+                )
+            except Exception as e:
+                voice_text = ""
+                st.sidebar.error(f"Voice recorder error: {e}")
 
     with col2:
         text_input = st.chat_input("Ask about symptoms...")
@@ -326,15 +400,15 @@ if not st.session_state.asking_for_details and not st.session_state.show_prescri
 
     if user_input:
         # Check for trigger keywords (Symptom flow)
-        if any(k in user_input.lower() for k in TRIGGER_KEYWORDS):
+        if TRIGGER_RE.search(user_input):
             st.session_state.messages.append({"role": "user", "content": user_input})
+            st.session_state.last_symptom = user_input
             st.session_state.asking_for_details = True
             with st.chat_message("assistant"):
                 msg = "*Context Required:* Please fill the form above."
                 st.session_state.messages.append({"role": "assistant", "content": msg})
                 st.markdown(msg)
-            st.experimental_rerun()
+            st.rerun()
         else:
-            # Standard Question flow
-            handle_final_response(user_input)
-            st.experimental_rerun()
+            # Standard Question flow; the streamed answer is already on screen, no rerun needed
+            handle_final_response(user_input, pending_exchange)